@@ -9,21 +9,339 @@ not limited by Claude Code Task tool constraints.
 
 import json
 import asyncio
+import contextlib
+import functools
+import hashlib
 import logging
 import os
+import random
+import re
+import sqlite3
 import subprocess
-from typing import Dict, List, Optional, Any
-from dataclasses import dataclass
-from datetime import datetime
+import time
+from collections import Counter, OrderedDict, deque
+from typing import Dict, List, Optional, Any, Tuple, Union, AsyncIterator
+from dataclasses import asdict, dataclass, replace
 from pathlib import Path
+from string import Template
 
-# Note: In production, would use actual Anthropic API client
-# from anthropic import AsyncAnthropic
+try:
+    import orjson
+    # orjson parses bytes directly; its JSONDecodeError subclasses json's
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
+try:
+    from anthropic import AsyncAnthropic
+except ImportError:
+    # Without the SDK, _call_haiku falls back to a simulated response
+    AsyncAnthropic = None
+
+try:
+    import fcntl
+except ImportError:
+    # Not available on Windows; the cost ledger is then updated without a lock
+    fcntl = None
+
+try:
+    import httpx
+except ImportError:
+    # Without httpx, all GitHub access goes through the gh CLI
+    httpx = None
+
+try:
+    import h2  # noqa: F401
+    # httpx then multiplexes the concurrent GitHub calls over one HTTP/2 connection
+    _HTTP2 = True
+except ImportError:
+    _HTTP2 = False
+
+try:
+    import re2 as _pattern_engine
+except ImportError:
+    # google-re2 runs the configured patterns in linear time; re is the fallback
+    _pattern_engine = re
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-@dataclass
+@functools.lru_cache(maxsize=8)
+def _read_config(path: str, mtime_ns: int) -> Dict[str, Any]:
+    """Parse a config file; keyed on mtime so an edited file is read again"""
+    return _json_loads(Path(path).read_bytes())
+
+# One Anthropic client per process, so every analyzer shares its connection pool
+_ANTHROPIC_CLIENT: Optional['AsyncAnthropic'] = None
+
+def _get_anthropic_client() -> Optional['AsyncAnthropic']:
+    """The shared Anthropic client, or None without the SDK or an API key"""
+    global _ANTHROPIC_CLIENT
+    if _ANTHROPIC_CLIENT is None and AsyncAnthropic is not None and os.getenv('ANTHROPIC_API_KEY'):
+        _ANTHROPIC_CLIENT = AsyncAnthropic(api_key=os.getenv('ANTHROPIC_API_KEY'))
+    return _ANTHROPIC_CLIENT
+
+# The gh CLI's token, asked for once per process so later analyzers skip the spawn
+_GH_AUTH_TOKEN: Optional[str] = None
+_GH_AUTH_TOKEN_CHECKED = False
+
+async def _github_token() -> Optional[str]:
+    """GITHUB_TOKEN, else the token the gh CLI is logged in with, else None"""
+    global _GH_AUTH_TOKEN, _GH_AUTH_TOKEN_CHECKED
+    if os.getenv('GITHUB_TOKEN'):
+        return os.getenv('GITHUB_TOKEN')
+    if not _GH_AUTH_TOKEN_CHECKED:
+        try:
+            proc = await asyncio.create_subprocess_exec(
+                'gh', 'auth', 'token', stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL
+            )
+            try:
+                stdout, _ = await asyncio.wait_for(proc.communicate(), timeout=10)
+            except asyncio.TimeoutError:
+                proc.kill()
+                await proc.wait()
+                stdout = b''
+            if proc.returncode == 0:
+                _GH_AUTH_TOKEN = stdout.decode().strip() or None
+        except OSError:
+            pass  # gh is not installed
+        _GH_AUTH_TOKEN_CHECKED = True
+    return _GH_AUTH_TOKEN
+
+# Run and job IDs from a check's details URL, e.g. .../actions/runs/123/job/456
+_RUN_ID_RE = re.compile(r'/actions/runs/(\d+)(?:/|$)')
+_JOB_ID_RE = re.compile(r'/actions/runs/\d+/job/(\d+)(?:[/?#]|$)')
+
+# GitHub Actions run URL -> owner, repo, run ID
+_ACTIONS_RE = re.compile(r'^https?://github\.com/([^/]+)/([^/]+)/actions/runs/(\d+)(?:/|$)')
+_MAX_RUNS_PER_BATCH = 10  # Keeps batched prompts and responses bounded
+
+# jq filter applied by `gh run view` so only failed or cancelled jobs are returned
+_FAILED_JOBS_JQ = '{name, jobs: [.jobs[] | select(.conclusion == "failure" or .conclusion == "cancelled") | {name, conclusion, databaseId}]}'
+
+# jq filter applied by `gh pr view` so only failed checks are returned
+_FAILED_CHECKS_JQ = '[.statusCheckRollup[] | select(.conclusion == "FAILURE") | {name, workflowName, detailsUrl}]'
+
+# One GraphQL round trip for a PR's latest check runs, with their job and run IDs
+_PR_CHECKS_QUERY = """
+query($owner: String!, $name: String!, $number: Int!) {
+  repository(owner: $owner, name: $name) {
+    pullRequest(number: $number) {
+      commits(last: 1) {
+        nodes { commit { statusCheckRollup { contexts(first: 100) { nodes {
+          ... on CheckRun {
+            name conclusion detailsUrl databaseId
+            checkSuite { workflowRun { databaseId workflow { name } } }
+          }
+        } } } } }
+      }
+    }
+  }
+}
+"""
+
+# Static Haiku instructions, sent as a cached system block so repeat calls bill
+# them at the prompt-cache read rate; only the failure summary varies per call
+_CI_PATTERNS_GUIDE = """Apply YOLO-FFMPEG-MCP error patterns:
+- UV dependency issues: pytest missing, --extra dev flag needed
+- Docker malformed files: =X.X.X version files from UV parsing errors
+- Python imports: MCP module resolution failures
+- Cache problems: Docker layer or dependency cache issues
+
+"""
+
+_ANALYSIS_SCHEMA = """{
+  "status": "FAILURE|PARTIAL|SUCCESS",
+  "primary_error": "Main blocking error",
+  "error_type": "dependency|docker_build|python_import|cache|workflow",
+  "confidence": 8,
+  "blocking_vs_warning": "BLOCKING|WARNING", 
+  "suggested_action": "Specific fix command or approach",
+  "github_commands": ["gh run view <id> --log"]
+}"""
+
+_GUIDE_FOOTER = "\n\nFocus on actionable solutions. Be concise for cost efficiency."
+
+_CI_ANALYSIS_GUIDE = _CI_PATTERNS_GUIDE + "Return ONLY JSON:\n" + _ANALYSIS_SCHEMA + _GUIDE_FOOTER
+
+# Batches need an array back, so their guide must not ask for a single object
+_BATCH_ANALYSIS_GUIDE = (
+    _CI_PATTERNS_GUIDE
+    + "Return ONLY a JSON array with one object per run, in the order given, each shaped like:\n"
+    + _ANALYSIS_SCHEMA + _GUIDE_FOOTER
+)
+
+_CI_ANALYSIS_REQUEST = Template("""Analyze CI failures for $repo using Build Detective patterns:
+
+$failures""")
+
+_BATCH_ANALYSIS_REQUEST = Template("""Analyze each of the following $count GitHub Actions runs separately.
+
+$sections
+
+Return ONLY a JSON array with exactly one analysis object per run, in the order given.""")
+
+# Answer returned when no Anthropic client is configured
+_MOCK_HAIKU_RESPONSE = """{
+    "status": "PARTIAL",
+    "primary_error": "Docker UV dependency parsing creates malformed files (=1.0.0, =1.9.3, etc.)",
+    "error_type": "docker_build",
+    "confidence": 9,
+    "blocking_vs_warning": "BLOCKING",
+    "suggested_action": "Quote version specifiers in Dockerfile UV commands and add cache-busting layer",
+    "github_commands": ["gh run view <run-id> --repo StigLau/yolo-ffmpeg-mcp --log"]
+}"""
+
+_JSON_CLOSERS = {'{': '}', '[': ']'}
+
+def _json_slice(text: str, openers: str = '{') -> Optional[str]:
+    """The outermost JSON value in text, starting at the first of openers, minus any prose around it"""
+    starts = [index for index in map(text.find, openers) if index >= 0]
+    if not starts:
+        return None
+    start = min(starts)
+    end = text.rfind(_JSON_CLOSERS[text[start]])
+    return text[start:end + 1] if end > start else None
+
+class _JSONEndScanner:
+    """Tracks bracket depth over streamed text to spot where the first JSON value closes"""
+    
+    def __init__(self, openers: str = '{'):
+        # The JSON starts at the first of openers, matching what _json_slice will parse
+        self.openers = openers
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+    
+    def feed(self, chunk: str) -> bool:
+        """Consume the next chunk; True once the outermost object or array has closed"""
+        for char in chunk:
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif char == '\\':
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+            elif not self.depth:
+                # Quotes and brackets in any prose before the JSON starts are ignored
+                if char in self.openers:
+                    self.depth = 1
+            elif char == '"':
+                self.in_string = True
+            elif char in '{[':
+                self.depth += 1
+            elif char in '}]':
+                self.depth -= 1
+                if not self.depth:
+                    return True
+        return False
+
+_CHARS_PER_TOKEN = 4  # Rough size of a Claude token in English and log text
+
+def _tail_within_budget(text: str, max_tokens: int) -> str:
+    """The last whole lines of text that fit in about max_tokens tokens"""
+    budget = max_tokens * _CHARS_PER_TOKEN
+    kept = []
+    for line in reversed(text.split('\n')):
+        if len(line) + 1 > budget:
+            if not kept:
+                # A single oversized line is cut rather than dropped
+                kept.append(line[-budget:])
+            break
+        kept.append(line)
+        budget -= len(line) + 1
+    return '\n'.join(reversed(kept))
+
+_MICRODOLLARS = 1_000_000  # CostTracker's integer unit per dollar
+
+# Answers for the configured patterns, used when one of them clearly explains
+# a failure so Haiku doesn't need to be asked
+_LOCAL_PATTERN_ANSWERS = {
+    "uv_dependency": {
+        "primary_error": "UV dependency issue: pytest missing, --extra dev flag needed",
+        "error_type": "dependency",
+        "suggested_action": "Install dev dependencies before testing, e.g. uv sync --extra dev",
+    },
+    "docker_malformed": {
+        "primary_error": "Docker UV dependency parsing creates malformed files (=X.X.X)",
+        "error_type": "docker_build",
+        "suggested_action": "Quote version specifiers in Dockerfile UV commands and add cache-busting layer",
+    },
+    "python_import": {
+        "primary_error": "MCP module imports failed",
+        "error_type": "python_import",
+        "suggested_action": "Check the package is installed in the test environment and module paths resolve",
+    },
+    "cache_issues": {
+        "primary_error": "Docker layer or dependency cache failure",
+        "error_type": "cache",
+        "blocking_vs_warning": "WARNING",
+        "suggested_action": "Clear or re-key the affected cache; builds continue without it",
+    },
+}
+_LOCAL_MIN_HITS = 2  # Matching lines needed before a pattern is trusted
+_LOCAL_DOMINANCE = 3  # ...and how many times the runner-up's count it must have
+_LOCAL_CONFIDENCE = 6  # Pattern votes are a heuristic, so local answers stay below escalation (7)
+# Lines that echo commands or package pins rather than report a failure, such as
+# " + pytest==8.2.0" or "##[group]Run uv sync --extra dev"; they never vote
+_LOCAL_NOISE_RE = re.compile(r'(?:^|\t)\s*(?:[+-] [\w.\[\]-]+==|(?:##\[group\])?Run )')
+# A local answer needs at least one line of real failure output
+_LOCAL_FAILURE_RE = re.compile(r'Traceback \(most recent call last\)|\bFAILED\b|[Ee]rror:')
+
+# claude-3-haiku prices in dollars per million tokens
+_HAIKU_PRICE_PER_MTOK = {"input": 0.25, "output": 1.25, "cache_write": 0.30, "cache_read": 0.03}
+
+# Error indicators in CI logs; focusing on these lines minimizes Haiku tokens.
+# Lowercase and matched against lowercased lines, which is several times
+# faster than an IGNORECASE alternation
+_ERROR_RE = re.compile(
+    r'error|failed|fatal:|exit code 1|not found|importerror|modulenotfounderror'
+    r'|=\d+\.\d+\.\d+'  # Malformed UV files
+    r'|pytest.*spawn|--extra dev'
+)
+_MAX_ERROR_LINES = 30  # Cost control
+# Numbers (versions, PIDs, timestamps, shard indexes) ignored when comparing excerpts
+_DIGITS_RE = re.compile(r'\d+')
+# Per-run noise stripped from kept lines: runner timestamps and ANSI colour codes.
+# Reruns of the same failure then yield identical excerpts and cache keys
+_LOG_NOISE_RE = re.compile(r'\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d(?:\.\d+)?Z ?|\x1b\[[0-9;]*[A-Za-z]')
+# Lines the Actions runner writes when a step fails; what follows is cleanup noise
+_TERMINAL_MARKERS = ('##[error]', 'Process completed with exit code')
+_LOG_BYTE_BUDGET = 4 * 1024 * 1024  # Stop reading a log after 4 MiB
+# Job logs are requested from this far before their end, where the failure is;
+# the runner's post-job cleanup after the failure marker is only a few KiB
+_LOG_TAIL_BYTES = 256 * 1024
+
+# Hints GitHub gives about when a rate-limited request may be retried
+_RETRY_AFTER_RE = re.compile(rb'retry[- ]after:?\s*(\d+)', re.IGNORECASE)
+_RATE_LIMIT_RESET_RE = re.compile(rb'x-ratelimit-reset:?\s*(\d+)', re.IGNORECASE)
+_MAX_RATE_LIMIT_WAIT = 60.0
+
+def _rate_limit_delay(stderr: bytes) -> Optional[float]:
+    """Seconds to wait before retrying a rate-limited gh call, or None if not rate-limited"""
+    if b'rate limit' not in stderr.lower():
+        return None
+    match = _RETRY_AFTER_RE.search(stderr)
+    if match:
+        return min(float(match[1]), _MAX_RATE_LIMIT_WAIT)
+    match = _RATE_LIMIT_RESET_RE.search(stderr)
+    if match:
+        return min(max(float(match[1]) - time.time(), 1.0), _MAX_RATE_LIMIT_WAIT)
+    return 0.0
+
+_GITHUB_ATTEMPTS = 3  # Tries per GitHub call when rate-limited
+_BACKOFF_BASE = 2.0  # Seconds before the first retry, doubled for each one after
+
+def _backoff_delay(attempt: int, floor: float = 0.0) -> float:
+    """Jittered exponential backoff for a retry, never shorter than GitHub's own hint"""
+    # Jitter keeps gathered calls that were limited together from retrying in lockstep
+    delay = _BACKOFF_BASE * 2 ** attempt * random.uniform(0.5, 1.5)
+    return min(max(delay, floor), _MAX_RATE_LIMIT_WAIT)
+
+# Below this many remaining API calls, requests are spread out until the window resets
+_RATE_LIMIT_LOW_WATER = 50
+
+@dataclass(slots=True, frozen=True)
 class CIAnalysisResult:
     """Results from Haiku CI analysis"""
     status: str  # SUCCESS, FAILURE, PARTIAL
@@ -36,7 +354,7 @@ class CIAnalysisResult:
     estimated_cost: float
     analysis_time: float
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class CIFailure:
     """CI failure information"""
     job_name: str
@@ -44,22 +362,107 @@ class CIFailure:
     run_id: str
     conclusion: str
     logs: Optional[str] = None
+    job_id: Optional[str] = None
 
 class HaikuCIAnalyzer:
     """Real Haiku-powered CI analyzer for cost-effective pattern recognition"""
     
     def __init__(self, config_path: str = "config/haiku-config.json"):
         self.config = self._load_config(config_path)
-        self.cost_tracker = CostTracker(self.config.get('cost_limits', {}))
-        # self.anthropic_client = AsyncAnthropic(api_key=os.getenv('ANTHROPIC_API_KEY'))
+        cache_config = self.config.get('cache', {})
+        cache_dir = Path(cache_config.get('dir', '~/.cache/build-detective')).expanduser()
+        persistent = cache_config.get('persistent', True)
+        # The daily budget is shared by every analyzer process through a ledger file
+        self.cost_tracker = CostTracker(self.config.get('cost_limits', {}), cache_dir / 'cost' if persistent else None)
+        # PR status rollups keyed by (repo, pr_number)
+        self._failures_cache = TTLCache(ttl=cache_config.get('pr_status_ttl', 300))
+        # Log excerpts keyed by (repo, run_id), so repeat analyses skip `gh run view --log`
+        self._log_cache = TTLCache(
+            max_entries=cache_config.get('log_entries', 128),
+            ttl=cache_config.get('log_ttl', 600)
+        )
+        # Caps concurrent gh processes to stay under GitHub's secondary rate limits
+        self._gh_semaphore = asyncio.Semaphore(self.config.get('gh_concurrency', 10))
+        # Caps concurrent log downloads, which are the largest and slowest GitHub calls
+        self._log_semaphore = asyncio.Semaphore(
+            self.config.get('concurrency', {}).get('log_fetch_workers', 8)
+        )
+        # Caps concurrent Haiku requests, so gathered batches stay under the API rate limit
+        self._haiku_semaphore = asyncio.Semaphore(
+            self.config.get('concurrency', {}).get('haiku_calls', 5)
+        )
+        # Configured error patterns as one named-group alternation, so the local
+        # classifier needs a single pass over each excerpt
+        categories: Dict[str, List[str]] = {}
+        for group in self.config.get('patterns', {}).values():
+            for name, pattern in group.items():
+                categories.setdefault(name, []).append(pattern)
+        # Inline (?i) because re2 takes its options in its own form, not re flags
+        self._category_re = _pattern_engine.compile(
+            '(?i)' + '|'.join(f"(?P<{name}>{'|'.join(patterns)})" for name, patterns in categories.items())
+        ) if categories else None
+        # Parsed Haiku answers keyed by prompt hash
+        self._haiku_cache = TTLCache(max_entries=cache_config.get('haiku_entries', 128))
+        # Raw Haiku answers keyed by error fingerprint, and log excerpts of finished
+        # jobs, shared across CLI runs
+        self.prompt_cache = None
+        self.excerpt_cache = None
+        if persistent:
+            self.prompt_cache = PromptCache(cache_dir / 'prompt_cache.sqlite', cache_config.get('prompt_ttl', 7 * 86400))
+            self.excerpt_cache = ExcerptCache(cache_dir / 'log_excerpts.sqlite', cache_config.get('excerpt_ttl', 7 * 86400))
+        # Shared across calls and analyzers so the SDK's HTTP connection pool stays warm
+        self.anthropic_client = _get_anthropic_client()
+        # Direct GitHub API access avoids a gh process per call; gh remains the fallback.
+        # Opened by _github_http on the first GitHub call, once the token is known
+        self._http = None
+        self._http_checked = False
+        self._http_lock = asyncio.Lock()
+        # Monotonic time before which no GitHub API request may start
+        self._next_allowed_at = 0.0
+    
+    async def aclose(self):
+        """Close the GitHub HTTP client and the persistent caches, if they were opened"""
+        if self._http is not None:
+            await self._http.aclose()
+        for cache in (self.prompt_cache, self.excerpt_cache):
+            if cache is not None:
+                cache.close()
+    
+    async def _github_http(self) -> Optional['httpx.AsyncClient']:
+        """The GitHub API client, opened on first use; None without httpx or a token"""
+        if not self._http_checked:
+            async with self._http_lock:
+                if not self._http_checked:
+                    token = await _github_token() if httpx is not None else None
+                    if token:
+                        self._http = httpx.AsyncClient(
+                            base_url='https://api.github.com',
+                            headers={
+                                'Authorization': f"Bearer {token}",
+                                'Accept': 'application/vnd.github+json',
+                            },
+                            timeout=30,
+                            http2=_HTTP2,
+                            limits=httpx.Limits(max_keepalive_connections=20),
+                            follow_redirects=True  # Job logs redirect to blob storage
+                        )
+                    self._http_checked = True
+        return self._http
+    
+    async def __aenter__(self) -> 'HaikuCIAnalyzer':
+        return self
+    
+    async def __aexit__(self, *exc_info: Any):
+        await self.aclose()
         
     def _load_config(self, config_path: str) -> Dict[str, Any]:
-        """Load configuration from JSON file"""
+        """Load configuration from JSON file, reusing the parsed result while the file is unchanged"""
         try:
-            with open(config_path, 'r') as f:
-                return json.load(f)
+            # Absolute, so the same relative path from another working directory isn't confused
+            path = os.path.abspath(config_path)
+            return _read_config(path, os.stat(path).st_mtime_ns)
         except FileNotFoundError:
-            logger.warning(f"Config file {config_path} not found, using defaults")
+            logger.warning("Config file %s not found, using defaults", config_path)
             return self._default_config()
     
     def _default_config(self) -> Dict[str, Any]:
@@ -68,12 +471,30 @@ class HaikuCIAnalyzer:
             "haiku": {
                 "model": "claude-3-haiku-20240307",
                 "max_tokens": 800,  # Cost optimization
-                "temperature": 0.1  # Consistent analysis
+                "temperature": 0.1,  # Consistent analysis
+                "per_failure_tokens": 200,  # Log excerpt budget per failure in the prompt
+                "timeout_s": 30,  # Fall back rather than wait longer for an answer
+                "mock_latency_s": 0.0  # Simulated API delay when no API key is set
             },
             "cost_limits": {
                 "daily_limit": 5.00,  # $5/day limit
                 "operation_limit": 0.10  # $0.10 per analysis max
             },
+            "gh_concurrency": 10,  # Max parallel gh processes
+            "concurrency": {
+                "log_fetch_workers": 8,  # Max logs downloaded at once, over gh or HTTP
+                "haiku_calls": 5  # Max Haiku requests in flight at once
+            },
+            "cache": {
+                "pr_status_ttl": 300,  # PR checks change on push, so keep them briefly
+                "log_entries": 128,
+                "log_ttl": 600,
+                "haiku_entries": 128,  # Identical prompts are answered from memory
+                "persistent": True,  # Answers for known error sets are kept on disk
+                "dir": "~/.cache/build-detective",
+                "prompt_ttl": 604800,  # One week
+                "excerpt_ttl": 604800  # Logs of finished jobs never change
+            },
             "patterns": {
                 "yolo_ffmpeg_mcp": {
                     "uv_dependency": "pytest not available|--extra dev",
@@ -95,211 +516,869 @@ class HaikuCIAnalyzer:
         Returns:
             CIAnalysisResult with Haiku-powered analysis
         """
-        start_time = datetime.now()
+        start_time = time.perf_counter()
+        failures: List[CIFailure] = []
         
-        if not self.cost_tracker.can_proceed():
+        if not await self.cost_tracker.reserve():
             raise CostLimitExceededException("Daily cost limit exceeded")
             
         try:
-            logger.info(f"🔍 Haiku analyzing PR{pr_number} failures...")
+            logger.info("🔍 Haiku analyzing PR%s failures...", pr_number)
             
-            # Step 1: Get PR CI status via GitHub CLI
-            failures = await self._get_pr_failures(repo, pr_number)
+            # Step 1: Get PR CI status via GitHub CLI. A failed lookup says nothing
+            # about the checks, so it must not read as a green PR
+            found = await self._get_pr_failures(repo, pr_number)
+            if found is None:
+                return self._fallback_analysis(failures)
+            failures = found
             
             if not failures:
-                return CIAnalysisResult(
-                    status="SUCCESS",
-                    primary_error="No CI failures found",
-                    error_type="none",
-                    confidence=10,
-                    blocking_vs_warning="SUCCESS",
-                    suggested_action="All checks passing",
-                    github_commands=[],
-                    estimated_cost=0.01,
-                    analysis_time=(datetime.now() - start_time).total_seconds()
-                )
+                return self._success_result(time.perf_counter() - start_time)
             
-            # Step 2: Get logs for failed jobs
-            enriched_failures = await self._enrich_failures_with_logs(repo, failures)
+            return await self._analyze_from_failures(repo, failures, start_time)
             
-            # Step 3: Use Haiku to analyze failure patterns
-            analysis_prompt = self._create_ci_analysis_prompt(enriched_failures, repo)
-            haiku_response = await self._call_haiku(analysis_prompt)
+        except Exception as e:
+            logger.error("❌ Haiku CI analysis failed: %s", e)
+            return self._fallback_analysis(failures)
+        finally:
+            self.cost_tracker.release()
+    
+    async def analyze_runs(self, urls: List[str]) -> List[CIAnalysisResult]:
+        """
+        Analyze several GitHub Actions runs with batched Haiku calls
+        
+        Failures and logs for all runs are fetched concurrently, then failing
+        runs are sent to Haiku in concurrent batches of up to 10 per request. A single
+        failing run is analyzed like a PR, so it can be answered from cache.
+        
+        Args:
+            urls: Run URLs (e.g., 'https://github.com/owner/repo/actions/runs/123')
+            
+        Returns:
+            One CIAnalysisResult per URL, in input order
+        """
+        start_time = time.perf_counter()
+        
+        if not await self.cost_tracker.reserve():
+            raise CostLimitExceededException("Daily cost limit exceeded")
+        reserved = True
+        
+        try:
+            results: List[Optional[CIAnalysisResult]] = [None] * len(urls)
+            runs: List[Tuple[int, str, str]] = []
+            for index, url in enumerate(urls):
+                match = _ACTIONS_RE.match(url)
+                if match:
+                    runs.append((index, f"{match[1]}/{match[2]}", match[3]))
+                else:
+                    logger.warning("Not a GitHub Actions run URL: %s", url)
+                    results[index] = self._fallback_analysis([])
+            
+            logger.info("🔍 Haiku analyzing %d runs...", len(runs))
+            # One run's lookup failing, even with gh missing, only costs that run its answer
+            run_failures = await asyncio.gather(
+                *(self._get_run_failures(repo, run_id) for _, repo, run_id in runs), return_exceptions=True
+            )
+            
+            failing_runs = []
+            for run, failures in zip(runs, run_failures):
+                if isinstance(failures, Exception):
+                    logger.error("❌ Failed to get failures of run %s: %s", run[2], failures)
+                    failures = None
+                if failures is None:
+                    results[run[0]] = self._fallback_analysis([])
+                elif failures:
+                    failing_runs.append((run, failures))
+                else:
+                    results[run[0]] = self._success_result(time.perf_counter() - start_time)
+            
+            if len(failing_runs) == 1:
+                (index, repo, _), failures = failing_runs[0]
+                try:
+                    results[index] = await self._analyze_from_failures(repo, failures, start_time)
+                except Exception as e:
+                    logger.error("❌ Haiku CI analysis failed: %s", e)
+                    results[index] = self._fallback_analysis(failures)
+                return results
+            
+            # Each batch reserves its own call, so this reservation would only
+            # hold back budget the batches need
+            self.cost_tracker.release()
+            reserved = False
+            
+            enriched = await asyncio.gather(*(
+                self._enrich_failures_with_logs(repo, failures) for (_, repo, _), failures in failing_runs
+            ))
             
-            # Step 4: Parse Haiku response
-            result = self._parse_haiku_response(haiku_response, failures)
-            result.analysis_time = (datetime.now() - start_time).total_seconds()
+            # Runs explained by a known pattern are answered locally, the rest batched
+            unexplained_runs = []
+            for (run, _), failures in zip(failing_runs, enriched):
+                result = self._classify_locally(failures)
+                if result is not None:
+                    results[run[0]] = replace(result, analysis_time=time.perf_counter() - start_time)
+                else:
+                    unexplained_runs.append((run, failures))
             
-            # Track cost
-            self.cost_tracker.record_operation("ci_analysis", result.estimated_cost)
+            # Runs failing with the same error lines, such as reruns, are sent once
+            # and share the answer
+            representatives = []
+            siblings: Dict[int, List[int]] = {}
+            first_index: Dict[Any, int] = {}
+            fingerprints: Dict[int, str] = {}
+            for run, failures in unexplained_runs:
+                fingerprint = self._error_fingerprint(run[1], failures)
+                key = fingerprint or run
+                if key in first_index:
+                    siblings[first_index[key]].append(run[0])
+                else:
+                    first_index[key] = run[0]
+                    siblings[run[0]] = [run[0]]
+                    if fingerprint:
+                        fingerprints[run[0]] = fingerprint
+                    representatives.append((run, failures))
             
-            logger.info(f"✅ Haiku analysis complete: {result.confidence}/10 confidence, ${result.estimated_cost:.4f}")
-            return result
+            # Error lines answered before, by single-run or batched analyses, need no Haiku call
+            answered: List[Tuple[int, CIAnalysisResult]] = []
+            if self.prompt_cache:
+                uncached = []
+                for run, failures in representatives:
+                    fingerprint = fingerprints.get(run[0])
+                    stored_response = self.prompt_cache.get(fingerprint) if fingerprint else None
+                    if stored_response is not None:
+                        answered.append((run[0], self._parse_haiku_response(stored_response, failures, 0.0)))
+                    else:
+                        uncached.append((run, failures))
+                representatives = uncached
             
+            # Batches go out together; _call_haiku bounds how many are in flight
+            batches = [
+                representatives[offset:offset + _MAX_RUNS_PER_BATCH]
+                for offset in range(0, len(representatives), _MAX_RUNS_PER_BATCH)
+            ]
+            batch_results = await asyncio.gather(*(self._analyze_batch(batch, fingerprints) for batch in batches))
+            for batch, batch_result in zip(batches, batch_results):
+                answered.extend((index, result) for ((index, _, _), _), result in zip(batch, batch_result))
+            
+            for index, result in answered:
+                result = replace(result, analysis_time=time.perf_counter() - start_time)
+                for sibling in siblings[index]:
+                    results[sibling] = result
+            
+            return results
+        finally:
+            if reserved:
+                self.cost_tracker.release()
+    
+    async def _analyze_batch(self, batch: List[Tuple[Tuple[int, str, str], List[CIFailure]]],
+                             fingerprints: Dict[int, str]) -> List[CIAnalysisResult]:
+        """
+        Analyze one batch of failing runs in a single Haiku call, falling back per run on errors
+        
+        Each run's answer is stored in the prompt cache under its error
+        fingerprint; fingerprints maps run indexes to those fingerprints.
+        """
+        # Each batch is its own Haiku call, so each is checked against the limits
+        if not await self.cost_tracker.reserve():
+            logger.warning("💸 Cost limit reached, skipping Haiku for a batch of %d runs", len(batch))
+            return [self._fallback_analysis(failures) for _, failures in batch]
+        
+        try:
+            haiku_response, haiku_cost, simulated = await self._call_haiku(
+                self._create_batch_analysis_prompt(batch), openers='[{', guide=_BATCH_ANALYSIS_GUIDE
+            )
+            batch_results = self._parse_haiku_batch_response(haiku_response, batch, haiku_cost)
+            if self.prompt_cache and not simulated:
+                # Stored as a single-run answer, which either analysis path can reuse
+                for ((index, _, _), _), result in zip(batch, batch_results):
+                    if index in fingerprints and result.error_type != "analysis_failure":
+                        self.prompt_cache.put(fingerprints[index], json.dumps(asdict(result)))
+            self.cost_tracker.record_operation("ci_batch_analysis", haiku_cost)
+            return batch_results
         except Exception as e:
-            logger.error(f"❌ Haiku CI analysis failed: {e}")
-            return self._fallback_analysis(failures if 'failures' in locals() else [])
+            logger.error("❌ Haiku batch analysis failed: %s", e)
+            return [self._fallback_analysis(failures) for _, failures in batch]
+        finally:
+            self.cost_tracker.release()
+    
+    async def _analyze_from_failures(self, repo: str, failures: List[CIFailure], start_time: float) -> CIAnalysisResult:
+        """Enrich one set of failures with logs, analyze it with Haiku and record the cost"""
+        # Step 2: Get logs for failed jobs
+        enriched_failures = await self._enrich_failures_with_logs(repo, failures)
+        
+        # Known patterns that clearly explain the logs need no Haiku call
+        result = self._classify_locally(enriched_failures)
+        if result is not None:
+            logger.info("✅ Matched known pattern locally: %s", result.error_type)
+            return replace(result, analysis_time=time.perf_counter() - start_time)
+        
+        # Step 3: Use Haiku to analyze failure patterns, reusing answers to identical
+        # prompts or to the same set of error lines seen in an earlier run
+        analysis_prompt = self._create_ci_analysis_prompt(enriched_failures, repo)
+        prompt_key = hashlib.blake2b(analysis_prompt.encode(), digest_size=16).hexdigest()
+        fingerprint = self._error_fingerprint(repo, enriched_failures) if self.prompt_cache else None
+        
+        result = self._haiku_cache.get(prompt_key)
+        if result is None and fingerprint:
+            stored_response = self.prompt_cache.get(fingerprint)
+            if stored_response is not None:
+                result = self._parse_haiku_response(stored_response, failures)
+        
+        if result is not None:
+            result = replace(result, estimated_cost=0.0)
+        else:
+            haiku_response, haiku_cost, simulated = await self._call_haiku(analysis_prompt)
+            
+            # Step 4: Parse Haiku response. Simulated answers are never cached, so a
+            # later run with an API key asks Haiku instead of replaying the mock
+            result = self._parse_haiku_response(haiku_response, failures, haiku_cost)
+            if result.error_type != "analysis_failure" and not simulated:
+                self._haiku_cache.put(prompt_key, result)
+                if fingerprint:
+                    self.prompt_cache.put(fingerprint, haiku_response)
+        
+        result = replace(result, analysis_time=time.perf_counter() - start_time)
+        
+        # Track cost
+        self.cost_tracker.record_operation("ci_analysis", result.estimated_cost)
+        
+        logger.info("✅ Haiku analysis complete: %s/10 confidence, $%.4f", result.confidence, result.estimated_cost)
+        return result
     
-    async def _get_pr_failures(self, repo: str, pr_number: str) -> List[CIFailure]:
-        """Get PR failures using GitHub CLI"""
+    def _success_result(self, analysis_time: float) -> CIAnalysisResult:
+        """Result for a PR or run without failed checks"""
+        return CIAnalysisResult(
+            status="SUCCESS",
+            primary_error="No CI failures found",
+            error_type="none",
+            confidence=10,
+            blocking_vs_warning="SUCCESS",
+            suggested_action="All checks passing",
+            github_commands=[],
+            estimated_cost=0.01,
+            analysis_time=analysis_time
+        )
+    
+    def _error_fingerprint(self, repo: str, failures: List[CIFailure]) -> Optional[str]:
+        """Fingerprint the distinct error lines of a failure set, or None without any logs"""
+        lines = {line for failure in failures if failure.logs for line in failure.logs.split('\n')}
+        if not lines:
+            return None
+        
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update('\n'.join(sorted(lines)).encode())
+        digest.update(repo.encode())
+        return digest.hexdigest()
+    
+    def _classify_locally(self, failures: List[CIFailure]) -> Optional[CIAnalysisResult]:
+        """Answer from the configured patterns when one clearly dominates the logs, else None"""
+        if self._category_re is None:
+            return None
+        lines = [
+            line for failure in failures if failure.logs
+            for line in failure.logs.split('\n') if not _LOCAL_NOISE_RE.search(line)
+        ]
+        if not any(map(_LOCAL_FAILURE_RE.search, lines)):
+            return None
+        # One vote per excerpt line, for the first category it matches
+        hits = Counter(match.lastgroup for match in map(self._category_re.search, lines) if match)
+        
+        ranked = hits.most_common(2)
+        if not ranked or ranked[0][1] < _LOCAL_MIN_HITS:
+            return None
+        name, count = ranked[0]
+        if len(ranked) > 1 and count < _LOCAL_DOMINANCE * ranked[1][1]:
+            return None
+        
+        answer = _LOCAL_PATTERN_ANSWERS.get(name, {
+            "primary_error": f"Known error pattern: {name}",
+            "error_type": name,
+            "suggested_action": "Apply the documented fix for this pattern",
+        })
+        return self._result_from_data(dict({"status": "FAILURE", "confidence": _LOCAL_CONFIDENCE}, **answer), 0.0)
+    
+    def _cluster_failures(self, failures: List[CIFailure]) -> List[List[CIFailure]]:
+        """Group failures whose log excerpts only differ in numbers, such as matrix shards"""
+        clusters: Dict[Any, List[CIFailure]] = {}
+        for failure in failures:
+            # Failures without logs can't be compared, so each stays on its own
+            key = _DIGITS_RE.sub('N', failure.logs.lower()) if failure.logs else id(failure)
+            clusters.setdefault(key, []).append(failure)
+        return list(clusters.values())
+    
+    async def analyze_many(self, repo: str, pr_numbers: List[str], concurrency: int = 4) -> List[CIAnalysisResult]:
+        """Analyze several PRs concurrently so their GitHub CLI calls overlap"""
+        # Bounded so a long PR list does not trip GitHub's secondary rate limits
+        semaphore = asyncio.Semaphore(concurrency)
+        
+        async def analyze_one(pr_number: str) -> CIAnalysisResult:
+            async with semaphore:
+                return await self.analyze_pr_failures(repo, pr_number)
+        
+        # One PR failing, such as on the cost limit, must not discard the others' results
+        results = await asyncio.gather(*(analyze_one(pr) for pr in pr_numbers), return_exceptions=True)
+        for index, (pr_number, result) in enumerate(zip(pr_numbers, results)):
+            if isinstance(result, Exception):
+                logger.error("❌ Haiku CI analysis of PR%s failed: %s", pr_number, result)
+                results[index] = self._fallback_analysis([])
+        return results
+    
+    async def _get_pr_failures(self, repo: str, pr_number: str) -> Optional[List[CIFailure]]:
+        """Get PR failures using GitHub CLI; None if the lookup failed"""
+        key = (repo, pr_number)
+        cached = self._failures_cache.get(key)
+        if cached is not None:
+            return list(cached)
+        
+        if await self._github_http() is not None:
+            failures = await self._get_pr_failures_graphql(repo, pr_number)
+            if failures is None:
+                return None
+            self._failures_cache.put(key, failures)
+            return list(failures)
+        
         try:
-            cmd = ['gh', 'pr', 'view', pr_number, '--repo', repo, '--json', 'statusCheckRollup']
-            result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+            # Filter to failed checks inside gh so only their fields cross the pipe
+            stdout = await self._run_gh(
+                'pr', 'view', pr_number, '--repo', repo, '--json', 'statusCheckRollup',
+                '--jq', _FAILED_CHECKS_JQ
+            )
             
-            data = json.loads(result.stdout)
             failures = []
+            for check in _json_loads(stdout):
+                # Extract run and job IDs from details URL
+                match = _RUN_ID_RE.search(check.get('detailsUrl') or '')
+                run_id = match[1] if match else None
+                match = _JOB_ID_RE.search(check.get('detailsUrl') or '')
+                job_id = match[1] if match else None
+                
+                failures.append(CIFailure(
+                    job_name=check['name'],
+                    workflow_name=check.get('workflowName') or 'Unknown',
+                    run_id=run_id,
+                    conclusion='FAILURE',
+                    job_id=job_id
+                ))
             
-            for check in data.get('statusCheckRollup', []):
-                if check.get('conclusion') == 'FAILURE':
-                    # Extract run ID from details URL
-                    run_id = None
-                    if 'detailsUrl' in check and '/runs/' in check['detailsUrl']:
-                        run_id = check['detailsUrl'].split('/runs/')[1].split('/')[0]
-                    
-                    failures.append(CIFailure(
-                        job_name=check['name'],
-                        workflow_name=check.get('workflowName', 'Unknown'),
-                        run_id=run_id,
-                        conclusion='FAILURE'
-                    ))
+            self._failures_cache.put(key, failures)
+            return list(failures)
             
+        except subprocess.CalledProcessError as e:
+            logger.error("GitHub CLI error: %s", e)
+            return None
+        except json.JSONDecodeError as e:
+            logger.error("JSON parsing error: %s", e)
+            return None
+    
+    async def _get_pr_failures_graphql(self, repo: str, pr_number: str) -> Optional[List[CIFailure]]:
+        """Get PR failures, with job IDs for per-job logs, in one GraphQL query; None if the query failed"""
+        owner, name = repo.split('/', 1)
+        try:
+            response = await self._github_request('POST', '/graphql', json={
+                'query': _PR_CHECKS_QUERY,
+                'variables': {'owner': owner, 'name': name, 'number': int(pr_number)},
+            })
+            response.raise_for_status()
+            data = _json_loads(response.content)
+            if data.get('errors'):
+                logger.error("GitHub GraphQL error: %s", data['errors'][0].get('message'))
+                return None
+            
+            commits = data['data']['repository']['pullRequest']['commits']['nodes']
+            rollup = commits[0]['commit']['statusCheckRollup'] if commits else None
+            checks = rollup['contexts']['nodes'] if rollup else []
+            
+            failures = []
+            for check in checks:
+                # Status contexts match no fragment and come back as empty objects
+                if check.get('conclusion') != 'FAILURE':
+                    continue
+                
+                workflow_run = (check.get('checkSuite') or {}).get('workflowRun') or {}
+                if workflow_run.get('databaseId'):
+                    run_id = str(workflow_run['databaseId'])
+                else:
+                    match = _RUN_ID_RE.search(check.get('detailsUrl') or '')
+                    run_id = match[1] if match else None
+                
+                failures.append(CIFailure(
+                    job_name=check['name'],
+                    workflow_name=(workflow_run.get('workflow') or {}).get('name') or 'Unknown',
+                    run_id=run_id,
+                    conclusion='FAILURE',
+                    job_id=str(check['databaseId']) if check.get('databaseId') else None
+                ))
             return failures
             
+        except httpx.HTTPError as e:
+            logger.error("GitHub API error: %s", e)
+            return None
+        except (json.JSONDecodeError, KeyError, TypeError) as e:
+            logger.error("GitHub API response error: %s", e)
+            return None
+    
+    async def _get_run_failures(self, repo: str, run_id: str) -> Optional[List[CIFailure]]:
+        """Get the failed jobs of one Actions run using GitHub CLI; None if the lookup failed"""
+        if await self._github_http() is not None:
+            return await self._get_run_failures_http(repo, run_id)
+        
+        try:
+            stdout = await self._run_gh(
+                'run', 'view', run_id, '--repo', repo, '--json', 'name,jobs',
+                '--jq', _FAILED_JOBS_JQ
+            )
+            data = _json_loads(stdout)
+            
+            return [
+                CIFailure(
+                    job_name=job['name'],
+                    workflow_name=data.get('name') or 'Unknown',
+                    run_id=run_id,
+                    conclusion=job['conclusion'].upper(),
+                    job_id=str(job['databaseId']) if job.get('databaseId') else None
+                )
+                for job in data['jobs']
+            ]
+            
         except subprocess.CalledProcessError as e:
-            logger.error(f"GitHub CLI error: {e}")
-            return []
+            logger.error("GitHub CLI error: %s", e)
+            return None
         except json.JSONDecodeError as e:
-            logger.error(f"JSON parsing error: {e}")
-            return []
+            logger.error("JSON parsing error: %s", e)
+            return None
+    
+    async def _get_run_failures_http(self, repo: str, run_id: str) -> Optional[List[CIFailure]]:
+        """Get the failed jobs of one Actions run from the REST API; None if the request failed"""
+        try:
+            response = await self._github_request(
+                'GET', f'/repos/{repo}/actions/runs/{run_id}/jobs', params={'filter': 'latest', 'per_page': 100}
+            )
+            response.raise_for_status()
+            
+            return [
+                CIFailure(
+                    job_name=job['name'],
+                    workflow_name=job.get('workflow_name') or 'Unknown',
+                    run_id=run_id,
+                    conclusion=job['conclusion'].upper(),
+                    job_id=str(job['id'])
+                )
+                for job in _json_loads(response.content)['jobs']
+                if job.get('conclusion') in ('failure', 'cancelled')
+            ]
+            
+        except httpx.HTTPError as e:
+            logger.error("GitHub API error: %s", e)
+            return None
+        except (json.JSONDecodeError, KeyError) as e:
+            logger.error("GitHub API response error: %s", e)
+            return None
+    
+    async def _github_request(self, method: str, url: str, **kwargs: Any) -> 'httpx.Response':
+        """Send a GitHub API request, pacing it and retrying with backoff when rate-limited"""
+        for attempt in range(_GITHUB_ATTEMPTS):
+            await self._wait_for_rate_limit()
+            response = await self._http.request(method, url, **kwargs)
+            
+            delay = self._note_rate_limit(response)
+            if delay is None or attempt == _GITHUB_ATTEMPTS - 1:
+                break
+            delay = _backoff_delay(attempt, delay)
+            self._next_allowed_at = max(self._next_allowed_at, time.monotonic() + delay)
+            logger.warning("GitHub rate limit hit, retrying in %.0fs", delay)
+        
+        return response
+    
+    async def _wait_for_rate_limit(self):
+        """Sleep until the GitHub API may be called again"""
+        delay = self._next_allowed_at - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+    
+    def _note_rate_limit(self, response: 'httpx.Response') -> Optional[float]:
+        """Update request pacing from GitHub's rate-limit headers
+        
+        Returns the delay before a retry if the request was rejected for
+        rate limiting, or None otherwise.
+        """
+        # Redirected log downloads carry the API headers on the first hop
+        headers = (response.history[0] if response.history else response).headers
+        remaining = headers.get('X-RateLimit-Remaining')
+        reset = headers.get('X-RateLimit-Reset')
+        now = time.monotonic()
+        
+        if response.status_code in (403, 429) and (headers.get('Retry-After') or remaining == '0'):
+            if headers.get('Retry-After'):
+                delay = float(headers['Retry-After'])
+            elif reset:
+                delay = max(float(reset) - time.time(), 1.0)
+            else:
+                delay = 5.0
+            delay = min(delay, _MAX_RATE_LIMIT_WAIT)
+            self._next_allowed_at = max(self._next_allowed_at, now + delay)
+            return delay
+        
+        if remaining and reset and int(remaining) < _RATE_LIMIT_LOW_WATER:
+            # Spread the remaining calls evenly over what is left of the window
+            pace = max(float(reset) - time.time(), 0.0) / max(int(remaining), 1)
+            self._next_allowed_at = max(self._next_allowed_at, now + min(pace, _MAX_RATE_LIMIT_WAIT))
+        return None
+    
+    async def _run_gh(self, *args: str, timeout: Optional[float] = None) -> bytes:
+        """Run a GitHub CLI command without blocking the event loop"""
+        cmd = ['gh', *args]
+        
+        for attempt in range(_GITHUB_ATTEMPTS):
+            async with self._gh_semaphore:
+                proc = await asyncio.create_subprocess_exec(
+                    *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+                )
+                try:
+                    stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    proc.kill()
+                    await proc.wait()
+                    raise subprocess.TimeoutExpired(cmd, timeout)
+            
+            if proc.returncode == 0:
+                return stdout
+            
+            # Back off when GitHub rate-limits us, then give up like any other failure
+            delay = _rate_limit_delay(stderr)
+            if delay is None or attempt == _GITHUB_ATTEMPTS - 1:
+                break
+            delay = _backoff_delay(attempt, delay)
+            logger.warning("GitHub rate limit hit, retrying in %.0fs", delay)
+            await asyncio.sleep(delay)
+        
+        raise subprocess.CalledProcessError(proc.returncode, cmd, output=stdout, stderr=stderr)
     
     async def _enrich_failures_with_logs(self, repo: str, failures: List[CIFailure]) -> List[CIFailure]:
         """Enrich failures with log snippets for Haiku analysis"""
-        enriched = []
+        # Jobs without a known ID share their run's log, so fetch each log once and all logs concurrently
+        sources = list(dict.fromkeys(filter(None, map(self._log_source, failures))))
+        excerpts = await asyncio.gather(*(self._fetch_log(repo, *source) for source in sources))
+        logs_by_source = dict(zip(sources, excerpts))
         
-        for failure in failures:
-            if failure.run_id:
+        # New instances, so failures held in the PR status cache stay log-free
+        return [
+            replace(failure, logs=logs_by_source[source])
+            if (source := self._log_source(failure)) and logs_by_source.get(source) is not None
+            else failure
+            for failure in failures
+        ]
+    
+    def _log_source(self, failure: CIFailure) -> Optional[Tuple[str, str]]:
+        """Which log holds a failure's output: its own job log when its ID is known, else its run's"""
+        if failure.job_id:
+            return ('job', failure.job_id)
+        return ('run', failure.run_id) if failure.run_id else None
+    
+    async def _fetch_log(self, repo: str, kind: str, log_id: str) -> Optional[str]:
+        """Fetch one job or run log and reduce it to its error lines"""
+        key = (repo, kind, log_id)
+        cached = self._log_cache.get(key)
+        if cached is not None:
+            return cached
+        
+        # Each attempt of a job gets a new ID, so a failed job's log is final once
+        # written. A re-run keeps its run ID, so run logs are never persisted
+        excerpt_cache = self.excerpt_cache if kind == 'job' else None
+        
+        try:
+            if excerpt_cache:
+                cached = excerpt_cache.get(repo, kind, log_id)
+                if cached is not None:
+                    self._log_cache.put(key, cached)
+                    return cached
+            
+            for attempt in range(_GITHUB_ATTEMPTS):
                 try:
-                    # Get focused log excerpt (last 50 lines of errors)
-                    cmd = ['gh', 'run', 'view', failure.run_id, '--repo', repo, '--log']
-                    result = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
-                    
-                    if result.returncode == 0:
-                        # Extract error patterns from logs (cost optimization)
-                        log_excerpt = self._extract_error_patterns(result.stdout)
-                        failure.logs = log_excerpt
-                        
-                except subprocess.TimeoutExpired:
-                    logger.warning(f"Timeout getting logs for {failure.run_id}")
+                    async with self._log_semaphore:
+                        if kind == 'job' and await self._github_http() is not None:
+                            excerpt = await self._stream_job_log(repo, log_id)
+                        elif kind == 'job':
+                            excerpt = await self._stream_gh_log(
+                                'api', '-i', f'repos/{repo}/actions/jobs/{log_id}/logs',
+                                '-H', f'Range: bytes=-{_LOG_TAIL_BYTES}', ranged=True
+                            )
+                        else:
+                            excerpt = await self._stream_gh_log('run', 'view', log_id, '--repo', repo, '--log')
+                    break
                 except Exception as e:
-                    logger.warning(f"Failed to get logs for {failure.run_id}: {e}")
+                    delay = self._log_retry_delay(e)
+                    if delay is None or attempt == _GITHUB_ATTEMPTS - 1:
+                        raise
+                    delay = _backoff_delay(attempt, delay)
+                    logger.warning("GitHub rate limit hit fetching %s %s logs, retrying in %.0fs", kind, log_id, delay)
+                    await asyncio.sleep(delay)
             
-            enriched.append(failure)
+            self._log_cache.put(key, excerpt)
+            if excerpt_cache:
+                excerpt_cache.put(repo, kind, log_id, excerpt)
+            return excerpt
+            
+        except subprocess.TimeoutExpired:
+            logger.warning("Timeout getting logs for %s %s", kind, log_id)
+        except Exception as e:
+            logger.warning("Failed to get logs for %s %s: %s", kind, log_id, e)
+        return None
+    
+    def _log_retry_delay(self, error: Exception) -> Optional[float]:
+        """GitHub's minimum wait before retrying a rate-limited log download, or None if it wasn't"""
+        if isinstance(error, subprocess.CalledProcessError):
+            return _rate_limit_delay(error.stderr or b'')
+        if httpx is not None and isinstance(error, httpx.HTTPStatusError):
+            return self._note_rate_limit(error.response)
+        return None
+    
+    async def _stream_job_log(self, repo: str, job_id: str) -> str:
+        """Stream the tail of one job's plain-text log from the REST API"""
+        url = f'/repos/{repo}/actions/jobs/{job_id}/logs'
+        await self._wait_for_rate_limit()
+        async with self._http.stream('GET', url, headers={'Range': f'bytes=-{_LOG_TAIL_BYTES}'}) as response:
+            self._note_rate_limit(response)
+            response.raise_for_status()
+            lines = response.aiter_lines()
+            if response.status_code == 206 and not response.headers.get('content-range', '').startswith('bytes 0-'):
+                # The tail starts mid-line; drop the fragment
+                await anext(lines, None)
+            try:
+                return await asyncio.wait_for(self._extract_error_patterns(lines), timeout=30)
+            except asyncio.TimeoutError:
+                raise subprocess.TimeoutExpired(url, 30)
+    
+    async def _stream_gh_log(self, *args: str, ranged: bool = False) -> str:
+        """Stream a log printed by the gh CLI, e.g. `gh api .../jobs/456/logs` or `gh run view --log`
+        
+        With ranged, args fetch a byte range with `gh api -i`, whose response
+        headers and any partial first line are skipped before extraction.
+        """
+        cmd = ['gh', *args]
+        
+        async def read_excerpt(stream: asyncio.StreamReader) -> str:
+            if ranged:
+                await self._skip_response_head(stream)
+            return await self._extract_error_patterns(stream)
         
-        return enriched
+        async with self._gh_semaphore:
+            proc = await asyncio.create_subprocess_exec(
+                *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+                limit=_LOG_BYTE_BUDGET
+            )
+            read_all = False
+            try:
+                # Extract error patterns while reading (cost optimization), so the
+                # full log is never buffered and reading stops once we have enough
+                excerpt = await asyncio.wait_for(read_excerpt(proc.stdout), timeout=30)
+                read_all = proc.stdout.at_eof()
+            except asyncio.TimeoutError:
+                raise subprocess.TimeoutExpired(cmd, 30)
+            finally:
+                # Only a gh we stopped reading from early is killed; killing one that is
+                # already exiting reaps it behind asyncio's back and loses its exit code
+                if not read_all and proc.returncode is None:
+                    proc.kill()
+                stderr = await proc.stderr.read()
+                await proc.wait()
+        
+        if read_all and proc.returncode != 0:
+            raise subprocess.CalledProcessError(proc.returncode, cmd, stderr=stderr)
+        return excerpt
     
-    def _extract_error_patterns(self, full_logs: str) -> str:
-        """Extract key error patterns from logs for cost-effective Haiku analysis"""
-        # Focus on error indicators to minimize tokens
-        error_indicators = [
-            "ERROR", "FAILED", "fatal:", "exit code 1",
-            "not found", "ImportError", "ModuleNotFoundError",
-            "=\\d+\\.\\d+\\.\\d+",  # Malformed UV files
-            "pytest.*spawn", "--extra dev"
-        ]
+    async def _skip_response_head(self, stream: asyncio.StreamReader):
+        """Consume the headers `gh api -i` prints, and the first line of a tail that starts mid-line"""
+        partial = False
+        await stream.readline()  # Status line
+        while header := (await stream.readline()).strip():
+            name, _, value = header.partition(b':')
+            if name.strip().lower() == b'content-range' and not value.strip().startswith(b'bytes 0-'):
+                partial = True
+        if partial:
+            await stream.readline()
+    
+    async def _extract_error_patterns(self, log_stream: AsyncIterator[Union[bytes, str]]) -> str:
+        """Extract key error patterns from a log stream for cost-effective Haiku analysis
         
-        lines = full_logs.split('\n')
-        relevant_lines = []
+        Keeps the last error lines leading up to the runner's first failure
+        marker, which is where the relevant traceback sits.
+        """
+        relevant_lines = deque(maxlen=_MAX_ERROR_LINES)
+        bytes_read = 0
         
-        for line in lines:
-            for indicator in error_indicators:
-                if indicator.lower() in line.lower():
-                    relevant_lines.append(line.strip())
+        try:
+            async for raw_line in log_stream:
+                bytes_read += len(raw_line)
+                line = raw_line.decode('utf-8', errors='replace') if isinstance(raw_line, bytes) else raw_line
+                if any(marker in line for marker in _TERMINAL_MARKERS):
+                    relevant_lines.append(_LOG_NOISE_RE.sub('', line).strip())
                     break
-            
-            # Limit to 30 lines for cost control
-            if len(relevant_lines) >= 30:
-                break
+                if _ERROR_RE.search(line.lower()):
+                    relevant_lines.append(_LOG_NOISE_RE.sub('', line).strip())
+                if bytes_read >= _LOG_BYTE_BUDGET:
+                    break
+        except ValueError:
+            # A single line longer than the byte budget; keep what we have
+            pass
         
-        return '\n'.join(relevant_lines[-30:])  # Last 30 error lines
+        return '\n'.join(relevant_lines)
     
     def _create_ci_analysis_prompt(self, failures: List[CIFailure], repo: str) -> str:
         """Create optimized prompt for Haiku CI analysis"""
-        failure_summary = []
+        # Limit log size to whole lines within a per-failure token budget; the lines
+        # nearest the failure marker come last in the excerpt and are kept first
+        max_tokens = self.config.get('haiku', {}).get('per_failure_tokens', 200)
+        # Matrix shards failing the same way are sent once, with a count of the others
+        failure_summary = "\n".join(
+            f"Job: {failure.job_name}"
+            + (f" (+{len(cluster) - 1} similar)" if len(cluster) > 1 else "")
+            + f"\nWorkflow: {failure.workflow_name}"
+            + (f"\nKey Errors:\n{_tail_within_budget(failure.logs, max_tokens)}" if failure.logs else "")
+            for cluster in self._cluster_failures(failures)
+            for failure in cluster[:1]
+        )
         
-        for failure in failures:
-            summary = f"Job: {failure.job_name}\nWorkflow: {failure.workflow_name}"
-            if failure.logs:
-                summary += f"\nKey Errors:\n{failure.logs[:500]}"  # Limit log size
-            failure_summary.append(summary)
+        return _CI_ANALYSIS_REQUEST.substitute(repo=repo, failures=failure_summary)
+    
+    def _create_batch_analysis_prompt(self, batch: List[Tuple[Tuple[int, str, str], List[CIFailure]]]) -> str:
+        """Create one Haiku prompt covering several failing runs"""
+        sections = "\n\n".join(
+            f"### Run {run_id}\n" + self._create_ci_analysis_prompt(failures, repo)
+            for (_, repo, run_id), failures in batch
+        )
+        return _BATCH_ANALYSIS_REQUEST.substitute(count=len(batch), sections=sections)
+    
+    async def _call_haiku(self, prompt: str, openers: str = '{', guide: str = _CI_ANALYSIS_GUIDE) -> Tuple[str, float, bool]:
+        """
+        Call Claude Haiku API directly (simulated when no client is configured)
         
-        return f"""Analyze CI failures for {repo} using Build Detective patterns:
-
-{chr(10).join(failure_summary)}
-
-Apply YOLO-FFMPEG-MCP error patterns:
-- UV dependency issues: pytest missing, --extra dev flag needed
-- Docker malformed files: =X.X.X version files from UV parsing errors
-- Python imports: MCP module resolution failures
-- Cache problems: Docker layer or dependency cache issues
-
-Return ONLY JSON:
-{{
-  "status": "FAILURE|PARTIAL|SUCCESS",
-  "primary_error": "Main blocking error",
-  "error_type": "dependency|docker_build|python_import|cache|workflow",
-  "confidence": 8,
-  "blocking_vs_warning": "BLOCKING|WARNING", 
-  "suggested_action": "Specific fix command or approach",
-  "github_commands": ["gh run view <id> --log"]
-}}
-
-Focus on actionable solutions. Be concise for cost efficiency."""
-    
-    async def _call_haiku(self, prompt: str) -> str:
-        """Call Claude Haiku API directly (simulated for now)"""
-        # In production, this would be:
-        # response = await self.anthropic_client.messages.create(
-        #     model="claude-3-haiku-20240307",
-        #     max_tokens=800,
-        #     temperature=0.1,
-        #     messages=[{"role": "user", "content": prompt}]
-        # )
-        # return response.content[0].text
-        
-        # Mock response simulating real Haiku analysis
-        logger.info("🤖 Calling Haiku API for CI analysis...")
-        await asyncio.sleep(0.5)  # Simulate API call
-        
-        return '''{
-            "status": "PARTIAL",
-            "primary_error": "Docker UV dependency parsing creates malformed files (=1.0.0, =1.9.3, etc.)",
-            "error_type": "docker_build",
-            "confidence": 9,
-            "blocking_vs_warning": "BLOCKING",
-            "suggested_action": "Quote version specifiers in Dockerfile UV commands and add cache-busting layer",
-            "github_commands": ["gh run view <run-id> --repo StigLau/yolo-ffmpeg-mcp --log"]
-        }'''
-    
-    def _parse_haiku_response(self, response: str, failures: List[CIFailure]) -> CIAnalysisResult:
+        Args:
+            prompt: The user prompt
+            openers: Characters the JSON answer may start with, as for _json_slice
+            guide: Cached system prompt describing the patterns and answer format
+            
+        Returns:
+            The response text, its estimated cost in dollars, and whether the
+            response was simulated rather than produced by Haiku
+        """
+        async with self._haiku_semaphore:
+            logger.info("🤖 Calling Haiku API for CI analysis...")
+            
+            if self.anthropic_client is not None:
+                # Bounded, so one hung request can't hold up analyses gathered alongside it
+                timeout = self.config.get('haiku', {}).get('timeout_s', 30)
+                try:
+                    text, cost = await asyncio.wait_for(
+                        self._stream_haiku(prompt, timeout, openers, guide), timeout=timeout
+                    )
+                    return text, cost, False
+                except asyncio.TimeoutError:
+                    logger.warning("Haiku call timed out after %ss", timeout)
+                    raise
+            
+            # Mock response simulating real Haiku analysis
+            mock_latency = self.config.get('haiku', {}).get('mock_latency_s', 0.0)
+            if mock_latency:
+                await asyncio.sleep(mock_latency)  # Simulate API call
+            
+            return _MOCK_HAIKU_RESPONSE, 0.0, True  # Nothing was spent, so nothing is charged
+    
+    async def _stream_haiku(self, prompt: str, timeout: float, openers: str = '{',
+                            guide: str = _CI_ANALYSIS_GUIDE) -> Tuple[str, float]:
+        """Stream one Haiku answer, stopping once its JSON is complete"""
+        haiku_config = self.config.get('haiku', {})
+        chunks = []
+        scanner = _JSONEndScanner(openers)
+        usage, output_tokens = None, 0
+        async with self.anthropic_client.messages.stream(
+            model=haiku_config.get('model', 'claude-3-haiku-20240307'),
+            max_tokens=haiku_config.get('max_tokens', 800),
+            temperature=haiku_config.get('temperature', 0.1),
+            system=[{"type": "text", "text": guide, "cache_control": {"type": "ephemeral"}}],
+            messages=[{"role": "user", "content": prompt}],
+            timeout=timeout  # Also closes the socket, not just the waiting task
+        ) as stream:
+            async for event in stream:
+                if event.type == 'message_start':
+                    usage = event.message.usage
+                elif event.type == 'message_delta':
+                    output_tokens = event.usage.output_tokens
+                elif event.type == 'content_block_delta' and event.delta.type == 'text_delta':
+                    chunks.append(event.delta.text)
+                    # Anything after the answer's closing bracket is prose we'd only wait for
+                    if scanner.feed(event.delta.text):
+                        break
+        
+        text = ''.join(chunks)
+        # Stopping early skips the final usage report, so estimate ~4 characters per token
+        return text, self._usage_cost(usage, output_tokens or len(text) // 4)
+    
+    def _usage_cost(self, usage: Any, output_tokens: Optional[int] = None) -> float:
+        """Dollar cost of one Haiku call from its token usage, counting prompt-cache reads and writes"""
+        price = self.config.get('haiku', {}).get('price_per_mtok', _HAIKU_PRICE_PER_MTOK)
+        tokens = {
+            "input": usage.input_tokens,
+            "output": usage.output_tokens if output_tokens is None else output_tokens,
+            "cache_write": getattr(usage, 'cache_creation_input_tokens', 0) or 0,
+            "cache_read": getattr(usage, 'cache_read_input_tokens', 0) or 0,
+        }
+        return sum(count * price.get(kind, 0.0) for kind, count in tokens.items()) / 1_000_000
+    
+    def _parse_haiku_response(self, response: str, failures: List[CIFailure],
+                              estimated_cost: float = 0.03) -> CIAnalysisResult:
         """Parse Haiku JSON response into structured result"""
+        # Haiku sometimes wraps the JSON in a sentence; parse only the object itself
+        payload = _json_slice(response)
         try:
-            data = json.loads(response)
-            
-            return CIAnalysisResult(
-                status=data.get('status', 'PARTIAL'),
-                primary_error=data.get('primary_error', 'Unknown error'),
-                error_type=data.get('error_type', 'unknown'),
-                confidence=data.get('confidence', 7),
-                blocking_vs_warning=data.get('blocking_vs_warning', 'BLOCKING'),
-                suggested_action=data.get('suggested_action', 'Manual investigation needed'),
-                github_commands=data.get('github_commands', []),
-                estimated_cost=0.03,  # Typical Haiku cost for this analysis
-                analysis_time=0.0  # Will be set by caller
-            )
-            
+            data = _json_loads(payload) if payload else None
         except json.JSONDecodeError:
+            data = None
+        
+        # Anything other than a JSON object can't be a valid analysis
+        if not isinstance(data, dict):
             logger.warning("Failed to parse Haiku response, using fallback")
             return self._fallback_analysis(failures)
+        return self._result_from_data(data, estimated_cost)
+    
+    def _parse_haiku_batch_response(self, response: str, batch: List[Tuple[Tuple[int, str, str], List[CIFailure]]],
+                                    estimated_cost: float) -> List[CIAnalysisResult]:
+        """Parse a batched Haiku JSON array into one result per run, in batch order"""
+        payload = _json_slice(response, '[{')
+        try:
+            data = _json_loads(payload) if payload else None
+        except json.JSONDecodeError:
+            data = None
+        
+        if not isinstance(data, (list, dict)):
+            logger.warning("Failed to parse Haiku batch response, using fallback")
+            return [self._fallback_analysis(failures) for _, failures in batch]
+        
+        # A lone object only answers a batch of one; for more runs it is a miscount
+        items = data if isinstance(data, list) else [data]
+        # Answers map to runs by position, which only holds if none were skipped
+        if len(items) != len(batch):
+            logger.warning("Haiku answered %d of %d runs, using fallback", len(items), len(batch))
+            return [self._fallback_analysis(failures) for _, failures in batch]
+        run_cost = estimated_cost / len(batch)
+        
+        return [
+            self._result_from_data(item, run_cost) if isinstance(item, dict)
+            else self._fallback_analysis(failures)
+            for item, (_, failures) in zip(items, batch)
+        ]
+    
+    def _result_from_data(self, data: Dict[str, Any], estimated_cost: float) -> CIAnalysisResult:
+        """Build a result from one parsed Haiku analysis object"""
+        return CIAnalysisResult(
+            status=data.get('status', 'PARTIAL'),
+            primary_error=data.get('primary_error', 'Unknown error'),
+            error_type=data.get('error_type', 'unknown'),
+            confidence=data.get('confidence', 7),
+            blocking_vs_warning=data.get('blocking_vs_warning', 'BLOCKING'),
+            suggested_action=data.get('suggested_action', 'Manual investigation needed'),
+            github_commands=data.get('github_commands', []),
+            estimated_cost=estimated_cost,
+            analysis_time=0.0  # Will be set by caller
+        )
     
     def _fallback_analysis(self, failures: List[CIFailure]) -> CIAnalysisResult:
         """Fallback analysis when Haiku fails"""
@@ -318,19 +1397,234 @@ Focus on actionable solutions. Be concise for cost efficiency."""
 class CostTracker:
     """Track and limit costs for Haiku operations - same as Komposteur pattern"""
     
-    def __init__(self, limits: Dict[str, float]):
+    def __init__(self, limits: Dict[str, float], ledger_dir: Optional[Path] = None):
         self.daily_limit = limits.get('daily_limit', 5.00)
         self.operation_limit = limits.get('operation_limit', 0.10)
-        self.daily_cost = 0.0
+        # One JSON file per UTC day holding that day's spend across all processes;
+        # without it, spend is only tracked for this process
+        self.ledger_dir = ledger_dir
+        # Integer micro-dollars, so thousands of small increments don't drift
+        self._spent = 0
+        # Estimated costs of operations that passed the limit check but haven't finished
+        self._reserved = 0
+        self._lock = asyncio.Lock()
+    
+    @property
+    def daily_cost(self) -> float:
+        return self._spent_today() / _MICRODOLLARS
+    
+    def _ledger_path(self) -> Path:
+        return self.ledger_dir / f"{time.strftime('%Y-%m-%d', time.gmtime())}.json"
+    
+    def _spent_today(self) -> int:
+        """Today's spend in micro-dollars, from the ledger when there is one"""
+        if self.ledger_dir is None:
+            return self._spent
+        try:
+            with open(self._ledger_path(), 'rb') as ledger:
+                if fcntl:
+                    fcntl.flock(ledger, fcntl.LOCK_SH)
+                data = ledger.read()
+            return int(_json_loads(data)['spent']) if data else 0
+        except FileNotFoundError:
+            return 0
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning("Cost ledger read failed: %s", e)
+            return self._spent
+    
+    def _add_to_ledger(self, amount: int):
+        """Add to today's ledger with a locked read-modify-write"""
+        path = self._ledger_path()
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with os.fdopen(os.open(path, os.O_RDWR | os.O_CREAT, 0o644), 'r+b') as ledger:
+                if fcntl:
+                    fcntl.flock(ledger, fcntl.LOCK_EX)
+                data = ledger.read()
+                spent = (int(_json_loads(data)['spent']) if data else 0) + amount
+                ledger.seek(0)
+                ledger.truncate()
+                ledger.write(json.dumps({'spent': spent, 'daily_cost': spent / _MICRODOLLARS}).encode())
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning("Cost ledger write failed: %s", e)
         
     def can_proceed(self, operation_cost: float = 0.03) -> bool:
         """Check if operation can proceed within cost limits"""
-        return (self.daily_cost + operation_cost) <= self.daily_limit and operation_cost <= self.operation_limit
+        total = self._spent_today() + self._reserved + round(operation_cost * _MICRODOLLARS)
+        return total <= round(self.daily_limit * _MICRODOLLARS) and operation_cost <= self.operation_limit
+    
+    async def reserve(self, operation_cost: float = 0.03) -> bool:
+        """Atomically check the limits and hold operation_cost against them
+        
+        Concurrent analyses each hold their estimate until release(), so they
+        can't all pass the check on the same remaining budget.
+        """
+        async with self._lock:
+            if not self.can_proceed(operation_cost):
+                return False
+            self._reserved += round(operation_cost * _MICRODOLLARS)
+            return True
+    
+    def release(self, operation_cost: float = 0.03):
+        """Drop a reservation once its operation has finished"""
+        self._reserved -= round(operation_cost * _MICRODOLLARS)
     
     def record_operation(self, operation_type: str, cost: float):
         """Record cost of completed operation"""
-        self.daily_cost += cost
-        logger.info(f"💰 {operation_type} cost: ${cost:.4f}, daily total: ${self.daily_cost:.2f}")
+        self._spent += round(cost * _MICRODOLLARS)
+        if self.ledger_dir is not None:
+            self._add_to_ledger(round(cost * _MICRODOLLARS))
+        logger.info("💰 %s cost: $%.4f, daily total: $%.2f", operation_type, cost, self.daily_cost)
+
+class TTLCache:
+    """Small in-process LRU cache whose entries can expire after a TTL"""
+    
+    def __init__(self, max_entries: int = 128, ttl: Optional[float] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[Any, Tuple[float, Any]]" = OrderedDict()
+        
+    def get(self, key: Any) -> Any:
+        """Return the cached value, or None when missing or expired"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        
+        stored_at, value = entry
+        if self.ttl is not None and time.monotonic() - stored_at >= self.ttl:
+            del self._entries[key]
+            return None
+        
+        self._entries.move_to_end(key)
+        return value
+    
+    def put(self, key: Any, value: Any):
+        """Store a value, evicting the least recently used entry when full"""
+        self._entries[key] = (time.monotonic(), value)
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+def _open_sqlite(db_path: Path, table: str, columns: str, ttl: float) -> sqlite3.Connection:
+    """Open a cache database for the analyzer's lifetime, creating its table and purging expired rows"""
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(db_path)
+    # WAL lets concurrent CLI runs read while one writes; losing the last cache
+    # write on power failure is fine, so commits skip the extra fsync
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA busy_timeout=5000")
+    # Rows are clustered on their key, so a lookup is one B-tree search rather
+    # than an index search followed by a rowid one
+    row = conn.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone()
+    if row and 'WITHOUT ROWID' not in row[0].upper():
+        # Written before tables were clustered; it's only a cache, so start over
+        conn.execute(f"DROP TABLE {table}")
+    conn.execute(f"CREATE TABLE IF NOT EXISTS {table} ({columns}) WITHOUT ROWID")
+    # Lookups skip stale rows, but only this purge removes them; the index on ts
+    # keeps it to the expired range instead of a full table scan
+    conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_ts ON {table} (ts)")
+    with conn:
+        conn.execute(f"DELETE FROM {table} WHERE ts <= ?", (time.time() - ttl,))
+    return conn
+
+class PromptCache:
+    """SQLite store of Haiku responses keyed by error fingerprint, shared across runs"""
+    
+    def __init__(self, db_path: Path, ttl: float):
+        self.db_path = db_path
+        self.ttl = ttl
+        self._conn: Optional[sqlite3.Connection] = None
+        
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = _open_sqlite(
+                self.db_path, 'prompt_cache', "fp TEXT PRIMARY KEY, json TEXT NOT NULL, ts REAL NOT NULL", self.ttl
+            )
+        return self._conn
+    
+    def close(self):
+        """Close the database connection, if one was opened"""
+        if self._conn is not None:
+            # Refreshes query planner statistics where they have gone stale; usually a no-op
+            with contextlib.suppress(sqlite3.Error):
+                self._conn.execute("PRAGMA optimize")
+            self._conn.close()
+            self._conn = None
+    
+    def get(self, fingerprint: str) -> Optional[str]:
+        """Return the stored Haiku response for a fingerprint, if still fresh"""
+        try:
+            row = self._connect().execute(
+                "SELECT json FROM prompt_cache WHERE fp = ? AND ts > ?",
+                (fingerprint, time.time() - self.ttl)
+            ).fetchone()
+        except (sqlite3.Error, OSError) as e:
+            logger.warning("Prompt cache lookup failed: %s", e)
+            return None
+        return row[0] if row else None
+    
+    def put(self, fingerprint: str, response: str):
+        """Store a Haiku response for a fingerprint"""
+        try:
+            conn = self._connect()
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO prompt_cache (fp, json, ts) VALUES (?, ?, ?)",
+                    (fingerprint, response, time.time())
+                )
+        except (sqlite3.Error, OSError) as e:
+            logger.warning("Prompt cache write failed: %s", e)
+
+class ExcerptCache:
+    """SQLite store of extracted log excerpts keyed by job or run, shared across runs"""
+    
+    def __init__(self, db_path: Path, ttl: float):
+        self.db_path = db_path
+        self.ttl = ttl
+        self._conn: Optional[sqlite3.Connection] = None
+        
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = _open_sqlite(
+                self.db_path, 'log_excerpts',
+                "repo TEXT NOT NULL, kind TEXT NOT NULL, log_id TEXT NOT NULL, "
+                "excerpt TEXT NOT NULL, ts REAL NOT NULL, PRIMARY KEY (repo, kind, log_id)", self.ttl
+            )
+        return self._conn
+    
+    def close(self):
+        """Close the database connection, if one was opened"""
+        if self._conn is not None:
+            # Refreshes query planner statistics where they have gone stale; usually a no-op
+            with contextlib.suppress(sqlite3.Error):
+                self._conn.execute("PRAGMA optimize")
+            self._conn.close()
+            self._conn = None
+    
+    def get(self, repo: str, kind: str, log_id: str) -> Optional[str]:
+        """Return the stored excerpt of a job or run log, if still fresh"""
+        try:
+            row = self._connect().execute(
+                "SELECT excerpt FROM log_excerpts WHERE repo = ? AND kind = ? AND log_id = ? AND ts > ?",
+                (repo, kind, log_id, time.time() - self.ttl)
+            ).fetchone()
+        except (sqlite3.Error, OSError) as e:
+            logger.warning("Excerpt cache lookup failed: %s", e)
+            return None
+        return row[0] if row else None
+    
+    def put(self, repo: str, kind: str, log_id: str, excerpt: str):
+        """Store the excerpt of a job or run log"""
+        try:
+            conn = self._connect()
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO log_excerpts (repo, kind, log_id, excerpt, ts) VALUES (?, ?, ?, ?, ?)",
+                    (repo, kind, log_id, excerpt, time.time())
+                )
+        except (sqlite3.Error, OSError) as e:
+            logger.warning("Excerpt cache write failed: %s", e)
 
 class CostLimitExceededException(Exception):
     """Exception raised when cost limits are exceeded"""
@@ -341,41 +1635,52 @@ async def main():
     """CLI entry point for Haiku CI analysis"""
     import sys
     
-    if len(sys.argv) != 3:
-        print("Usage: python haiku_ci_analyzer.py <repo> <pr_number>")
-        print("Example: python haiku_ci_analyzer.py StigLau/yolo-ffmpeg-mcp 16")
+    args = [arg for arg in sys.argv[1:] if arg not in ('-v', '--verbose')]
+    run_urls = [arg for arg in args if _ACTIONS_RE.match(arg)]
+    if not run_urls and len(args) < 2:
+        print("Usage: python haiku_ci_analyzer.py [--verbose] <repo> <pr_number> [<pr_number> ...]")
+        print("       python haiku_ci_analyzer.py [--verbose] <run_url> [<run_url> ...]")
+        print("Example: python haiku_ci_analyzer.py StigLau/yolo-ffmpeg-mcp 16 17")
         return 1
     
-    repo = sys.argv[1]
-    pr_number = sys.argv[2]
+    # Progress logging is opt-in; one-shot runs only print the analysis
+    verbose = len(args) != len(sys.argv) - 1 or bool(os.getenv('BD_DEBUG'))
+    logging.basicConfig(level=logging.INFO if verbose else logging.WARNING)
     
-    analyzer = HaikuCIAnalyzer()
-    
-    try:
-        result = await analyzer.analyze_pr_failures(repo, pr_number)
-        
-        print(f"🤖 Haiku CI Analysis - {repo} PR#{pr_number}")
-        print("=" * 60)
-        print(f"Status: {result.status}")
-        print(f"Primary Error: {result.primary_error}")
-        print(f"Type: {result.error_type}")
-        print(f"Confidence: {result.confidence}/10")
-        print(f"Classification: {result.blocking_vs_warning}")
-        print(f"💡 Action: {result.suggested_action}")
-        print(f"💰 Cost: ${result.estimated_cost:.4f}")
-        print(f"⏱️ Time: {result.analysis_time:.2f}s")
-        
-        if result.github_commands:
-            print(f"🔧 Commands: {', '.join(result.github_commands)}")
-        
-        return 0
-        
-    except CostLimitExceededException as e:
-        print(f"💸 Cost limit exceeded: {e}")
-        return 1
-    except Exception as e:
-        print(f"❌ Analysis failed: {e}")
-        return 1
+    async with HaikuCIAnalyzer() as analyzer:
+        try:
+            if run_urls:
+                titles = [f"run {url}" for url in args]
+                results = await analyzer.analyze_runs(args)
+            else:
+                repo = args[0]
+                titles = [f"{repo} PR#{pr_number}" for pr_number in args[1:]]
+                results = await analyzer.analyze_many(repo, args[1:])
+            
+            for title, result in zip(titles, results):
+                print(f"🤖 Haiku CI Analysis - {title}")
+                print("=" * 60)
+                print(f"Status: {result.status}")
+                print(f"Primary Error: {result.primary_error}")
+                print(f"Type: {result.error_type}")
+                print(f"Confidence: {result.confidence}/10")
+                print(f"Classification: {result.blocking_vs_warning}")
+                print(f"💡 Action: {result.suggested_action}")
+                print(f"💰 Cost: ${result.estimated_cost:.4f}")
+                print(f"⏱️ Time: {result.analysis_time:.2f}s")
+                
+                if result.github_commands:
+                    print(f"🔧 Commands: {', '.join(result.github_commands)}")
+                print()
+            
+            return 0
+            
+        except CostLimitExceededException as e:
+            print(f"💸 Cost limit exceeded: {e}")
+            return 1
+        except Exception as e:
+            print(f"❌ Analysis failed: {e}")
+            return 1
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file